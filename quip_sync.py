@@ -2,71 +2,332 @@ import os
 import sys
 import argparse
 import time
+import random
+import threading
 import urllib.error
+import urllib.parse
 import requests
-from quip import QuipClient
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from quip import QuipClient, QuipError
 import hashlib
 import json
 import re
 import mimetypes
+from functools import lru_cache
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import orjson  # Optional, only used to speed up reading and writing the cache
+except ImportError:
+    orjson = None
+
+# Edit locations for client.edit_document. QuipClient only names the section
+# based ones; Quip has no location that replaces a whole document, so updates
+# delete the content under the first heading and prepend the new markdown.
+PREPEND = QuipClient.PREPEND
+BEFORE_DOCUMENT_RANGE = 7
+DELETE_DOCUMENT_RANGE = 9
+
+# First top-level heading of a document's HTML, whose range is deleted on update.
+# The heading may have attributes and span several lines
+H1_PATTERN = re.compile(r'<h1[^>]*>(.*?)</h1>', re.DOTALL)
+
+# Markdown image references: ![alt_text](image_path). The path stops at the
+# first ')' without backtracking across it
+IMAGE_MARKDOWN_PATTERN = re.compile(r'!\[(.*?)\]\(([^)\n]*)\)')
+
+# Placeholders that preprocess_markdown_for_images leaves in the uploaded HTML
+IMAGE_PLACEHOLDER_PATTERN = re.compile(r'image path:\s*\(([^)]+)\)')
+
+# Folder ID: the first path segment of a Quip URL, with or without the scheme
+FOLDER_ID_PATTERN = re.compile(r'(?:https?://)?[^/]+/([A-Za-z0-9]+)')
+
+class SessionQuipClient(QuipClient):
+    """QuipClient that sends every request over one pooled keep-alive session
+    
+    The stock client opens a new connection (and TLS handshake) for each API
+    call. pool_size is the number of connections kept open to the Quip host;
+    it should be at least the number of threads making calls, or urllib3
+    discards the extra connections. Errors are raised the same way the stock
+    client raises them.
+    """
+
+    def __init__(self, *args, pool_size=16, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = requests.Session()
+        # Failing to connect happens before a request is sent, so it is always
+        # retried. A request cut off mid-way (e.g. the server reset a pooled
+        # keep-alive connection) is retried only for GETs, since Quip's writes
+        # are POSTs that may already have taken effect. Error responses are
+        # left to retry_api_call.
+        retries = Retry(total=3, connect=3, read=3, other=0, backoff_factor=0.5)
+        # All calls go to one host, so only that host's pool size matters
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retries)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if self.access_token:
+            self.session.headers['Authorization'] = 'Bearer ' + self.access_token
+
+    def _raise_for_status(self, response):
+        """Raise a QuipError (or HTTPError) for a failed response"""
+        if response.status_code < 400:
+            return
+        http_error = urllib.error.HTTPError(
+            response.url, response.status_code, response.reason, response.headers, None)
+        try:
+            # Extract the developer-friendly error message from the response
+            message = response.json()['error_description']
+        except Exception:
+            raise http_error
+        raise QuipError(response.status_code, message, http_error)
+
+    def _fetch_json(self, path, post_data=None, **args):
+        url = self._url(path, **args)
+        if post_data:
+            post_data = dict((k, v) for k, v in post_data.items() if v or isinstance(v, int))
+            response = self.session.post(url, data=self._clean(**post_data), timeout=self.request_timeout)
+        else:
+            response = self.session.get(url, timeout=self.request_timeout)
+        self._raise_for_status(response)
+        return response.json()
+
+    def put_blob(self, thread_id, blob, name=None, content_type=None):
+        if name:
+            blob = (name, blob, content_type) if content_type else (name, blob)
+        response = self.session.post(
+            self._url('blob/' + thread_id), files={'blob': blob}, timeout=self.request_timeout)
+        self._raise_for_status(response)
+        return response.json()
 
 def get_domain_from_link(url):
     """Extract domain from a Quip URL"""
     if not url:
         return None
-    if '://' in url:
-        url = url.split('://', 1)[1]
-    return url.split('/', 1)[0]
+    if '://' not in url:
+        url = '//' + url  # Let urlparse recognize the domain of a scheme-less URL
+    return urllib.parse.urlparse(url).netloc or None
 
 def extract_folder_id_from_url(url):
     """Extract folder ID from a Quip URL"""
-    parts = url.strip('/').split('/')
-    for part in parts:
-        if part and not part.startswith('http') and not part.endswith('.com'):
-            return part
-    return None
+    match = FOLDER_ID_PATTERN.match(url.strip())
+    return match.group(1) if match else None
+
+def get_cache_log_path(cache_file):
+    """Get the path of the log holding cache updates made since the last save"""
+    return cache_file + '.log'
 
 def load_cache(cache_file):
-    """Load the sync cache from file"""
+    """Load the sync cache from file, replaying any updates logged since it was saved"""
     try:
-        with open(cache_file, 'r') as f:
-            return json.load(f)
+        with open(cache_file, 'rb') as f:
+            data = f.read()
+        cache = orjson.loads(data) if orjson else json.loads(data)
     except FileNotFoundError:
-        return {}
+        cache = {}
+
+    try:
+        with open(get_cache_log_path(cache_file), 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Skip a partial line left by an interrupted write
+                if record['entry'] is None:
+                    cache.pop(record['path'], None)
+                else:
+                    cache[record['path']] = record['entry']
+    except FileNotFoundError:
+        pass
+
+    # Old caches stored just the hash string; migrate them to the dict format
+    for file_path, cached_info in cache.items():
+        if isinstance(cached_info, str):
+            cache[file_path] = {'hash': cached_info, 'doc_id': None}
+    return cache
+
+# Cache entry fields describing a file's sync state. An entry where only the
+# other fields (its timestamps) changed doesn't need logging right away
+SYNC_STATE_FIELDS = ('hash', 'hash_algo', 'mtime_ns', 'size', 'doc_id', 'sync_success')
+
+def sync_state_changed(old_entry, new_entry):
+    """Check whether a new cache entry changes the file's sync state"""
+    return any(old_entry.get(field) != new_entry.get(field) for field in SYNC_STATE_FIELDS)
+
+def append_cache_log(cache_file, file_path, cache_entry):
+    """Durably record one cache update, or a removal if cache_entry is None
+    
+    Each update is flushed to disk right away so an interrupted sync keeps
+    its progress instead of re-uploading everything on the next run.
+    """
+    with open(get_cache_log_path(cache_file), 'a') as f:
+        f.write(json.dumps({'path': file_path, 'entry': cache_entry}) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+# During a sync, the logged updates are folded into the cache file after this
+# many files or seconds, whichever comes first, so the log stays short
+CACHE_SAVE_INTERVAL_FILES = 100
+CACHE_SAVE_INTERVAL_SECONDS = 60
 
 def save_cache(cache_file, cache):
-    """Save the sync cache to file"""
-    with open(cache_file, 'w') as f:
-        json.dump(cache, f)
+    """Save the sync cache to file and clear the update log it now includes
+    
+    The cache is written to a temporary file first and then moved into place,
+    so a crash mid-write can't leave a truncated cache behind.
+    """
+    if orjson:
+        data = orjson.dumps(cache)
+    else:
+        data = json.dumps(cache).encode('utf-8')
+    temp_file = cache_file + '.tmp'
+    with open(temp_file, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, cache_file)
+    try:
+        os.remove(get_cache_log_path(cache_file))
+    except FileNotFoundError:
+        pass
+
+# Name of the content hash stored in the cache; entries hashed with anything
+# else (older caches used MD5) are treated as changed and re-synced once
+HASH_ALGO = 'blake2b'
 
-def get_file_hash(file_path):
-    """Calculate MD5 hash of file content"""
+# A file modified this close to when it was last stat'd and read could be
+# modified again without changing its mtime on filesystems with coarse
+# timestamps, so its cached hash isn't trusted on mtime and size alone
+RACY_MTIME_WINDOW_NS = 2 * 10**9
+
+def read_file_bytes(file_path):
+    """Read the raw content of a file in one go"""
     try:
         with open(file_path, 'rb') as f:
-            return hashlib.md5(f.read()).hexdigest()
+            return f.read()
     except Exception as e:
         print(f"Error reading file {file_path}: {e}")
         return None
 
-def retry_api_call(func, *args, max_retries=3, rate_limit=0.5, **kwargs):
-    """Retry API calls with exponential backoff and rate limiting"""
+def get_content_hash(raw_content):
+    """Calculate BLAKE2b hash of file content"""
+    # Only used for change detection, so a fast non-MD5 digest is enough
+    return hashlib.blake2b(raw_content, digest_size=16).hexdigest()
+
+class AdaptiveLimiter:
+    """Thread-safe client-side rate limiter that adapts to the server's 429 responses
+    
+    Calls are spaced `delay` seconds apart across all workers. The delay shrinks
+    after every successful call and grows whenever Quip reports rate limiting.
+    """
+
+    def __init__(self, initial_delay=0.1, max_delay=60):
+        self.delay = initial_delay
+        self.max_delay = max_delay
+        self.next_call = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until this caller's slot comes up"""
+        with self.lock:
+            now = time.monotonic()
+            wait_time = self.next_call - now
+            self.next_call = max(now, self.next_call) + self.delay
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+    def on_success(self):
+        """Speed up while the server keeps accepting calls"""
+        with self.lock:
+            # Drop the delay entirely once it becomes negligible
+            self.delay = self.delay * 0.9 if self.delay > 0.001 else 0.0
+
+    def on_429(self, retry_after=0):
+        """Slow down, and pause every worker for at least `retry_after` seconds"""
+        with self.lock:
+            self.delay = min(self.max_delay, max(self.delay * 2, 0.5))
+            self.next_call = max(self.next_call, time.monotonic() + retry_after)
+
+class TokenBucket:
+    """Thread-safe token bucket capping the sustained rate of API calls
+    
+    Up to `capacity` calls go out back to back; after that, calls are let
+    through at `rate` per second as the bucket refills.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self.condition = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        with self.condition:
+            self._refill()
+            while self.tokens < 1:
+                self.condition.wait((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+# Quip's default API limit for a user, in requests per minute
+DEFAULT_RATE_LIMIT = 50
+
+# Shared by every API call so parallel workers collectively stay under the quota:
+# the bucket enforces Quip's published limit, and the adaptive limiter backs off
+# further whenever the server still answers with 429
+token_bucket = TokenBucket(rate=DEFAULT_RATE_LIMIT / 60, capacity=DEFAULT_RATE_LIMIT)
+rate_limiter = AdaptiveLimiter()
+
+def get_retry_after(error):
+    """Get the Retry-After header (in seconds) from an HTTP error, or 0 if absent"""
+    http_error = getattr(error, 'http_error', error)  # QuipError wraps the HTTPError
+    headers = getattr(http_error, 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After', 0))
+    except (TypeError, ValueError):
+        return 0
+
+# HTTP status codes worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+def retry_api_call(func, *args, max_retries=5, base_delay=1.0, jitter=0.5, **kwargs):
+    """Retry API calls with exponential backoff and rate limiting
+    
+    Waits honor the server's Retry-After header, are capped at 30 seconds
+    otherwise, and are stretched by up to `jitter` so parallel workers don't
+    retry in lockstep.
+    """
     retries = 0
     while retries < max_retries:
         try:
+            # Wait for our share of the API rate limit
+            token_bucket.acquire()
+            rate_limiter.acquire()
             result = func(*args, **kwargs)
-            # Add rate limiting delay after successful call
-            time.sleep(rate_limit)
+            rate_limiter.on_success()
             return result
-        except urllib.error.HTTPError as e:
-            if e.code == 504:  # Gateway Timeout
-                wait_time = 2 ** retries
+        except (urllib.error.HTTPError, QuipError) as e:
+            if e.code in RETRYABLE_STATUS_CODES:
+                retry_after = get_retry_after(e)
+                wait_time = max(retry_after, min(30, base_delay * 2 ** retries)) * (1 + random.uniform(0, jitter))
                 retries += 1
-                if retries < max_retries:
-                    print(f"Gateway timeout, retrying in {wait_time} seconds... (Attempt {retries}/{max_retries})")
-                    time.sleep(wait_time)
-                else:
+                if retries >= max_retries:
                     print(f"Failed after {max_retries} attempts: {e}")
                     raise
+                if e.code == 429:  # Too Many Requests
+                    rate_limiter.on_429(retry_after)
+                    print(f"Rate limited, retrying in {wait_time:.1f} seconds... (Attempt {retries}/{max_retries})")
+                else:
+                    print(f"Server error {e.code}, retrying in {wait_time:.1f} seconds... (Attempt {retries}/{max_retries})")
+                time.sleep(wait_time)
             else:
                 print(f"HTTP Error: {e}")
                 raise
@@ -74,35 +335,124 @@ def retry_api_call(func, *args, max_retries=3, rate_limit=0.5, **kwargs):
             print(f"Error: {e}")
             raise
 
-def create_folder_structure(client, folder_path, parent_id):
-    """Create folder structure in Quip"""
-    folders = folder_path.split(os.sep)
-    current_folder_id = parent_id
+# Guards the per-run folder cache, which file sync workers share with the
+# thread that creates folders. It is never held across an API call, so workers
+# aren't stalled behind rate limit waits; results are fetched first and then
+# published, keeping whichever copy was published first.
+folder_cache_lock = threading.RLock()
 
-    for folder in folders:
-        if not folder:
-            continue
-        
-        # Check if folder exists at current level
-        folder_list = retry_api_call(client.get_folder, current_folder_id)
-        folder_found = False
-        
-        for child in folder_list['children']:
-            if 'folder_id' in child:
-                # Get folder details to check the title
-                folder_data = retry_api_call(client.get_folder, child['folder_id'])
-                folder_title = folder_data.get('folder', {}).get('title', '')
-                if folder_title == folder:
-                    current_folder_id = child['folder_id']
-                    folder_found = True
-                    break
-        
-        if not folder_found:
-            new_folder = retry_api_call(client.new_folder, title=folder, parent_id=current_folder_id)
-            print(f"Created folder: {folder}")
-            current_folder_id = new_folder['folder']['id']
+def get_folder_cached(client, folder_id, folder_cache):
+    """Get folder contents, reusing the listing already fetched during this sync run"""
+    with folder_cache_lock:
+        folder_content = folder_cache.get(folder_id)
+    if folder_content is None:
+        folder_content = retry_api_call(client.get_folder, folder_id)
+        with folder_cache_lock:
+            folder_content = folder_cache.setdefault(folder_id, folder_content)
+    return folder_content
+
+def get_child_folder_titles(client, folder_content):
+    """Get the titles of all subfolders of a folder with a single batch call"""
+    folder_ids = [child['folder_id'] for child in folder_content.get('children', []) if 'folder_id' in child]
+    if not folder_ids:
+        return {}
+    folders = retry_api_call(client.get_folders, folder_ids)
+    return {folder_id: data.get('folder', {}).get('title', '') for folder_id, data in folders.items()}
+
+def get_child_thread_titles(client, folder_content):
+    """Get the titles of all documents in a folder with a single batch call"""
+    thread_ids = [child['thread_id'] for child in folder_content.get('children', []) if 'thread_id' in child]
+    if not thread_ids:
+        return {}
+    threads = retry_api_call(client.get_threads, thread_ids)
+    return {thread_id: data.get('thread', {}).get('title', '') for thread_id, data in threads.items()}
+
+def get_title_index(client, folder_id, folder_cache):
+    """Get a {title: thread_id} index of the documents in a folder, built once per run"""
+    folder_content = get_folder_cached(client, folder_id, folder_cache)
+    with folder_cache_lock:
+        if 'title_index' in folder_content:
+            return folder_content['title_index']
+    try:
+        # Fetch the titles of all documents in the folder in one batch call
+        thread_titles = get_child_thread_titles(client, folder_content)
+    except Exception:
+        return {}
+    title_index = {}
+    for thread_id, thread_title in thread_titles.items():
+        title_index.setdefault(thread_title, thread_id)
+    with folder_cache_lock:
+        return folder_content.setdefault('title_index', title_index)
+
+def get_or_create_folder(client, title, parent_id, folder_cache):
+    """Get the ID of the subfolder with the given title, creating it if missing
+    
+    Only called from the thread that creates folders, so two calls can't both
+    create the same folder.
+    """
+    # Check if folder exists at current level
+    folder_list = get_folder_cached(client, parent_id, folder_cache)
+    
+    # Fetch the titles of all subfolders in one batch call, once per folder
+    with folder_cache_lock:
+        folder_titles = folder_list.get('folder_titles')
+    if folder_titles is None:
+        folder_titles = get_child_folder_titles(client, folder_list)
+        with folder_cache_lock:
+            folder_titles = folder_list.setdefault('folder_titles', folder_titles)
+    for child_folder_id, folder_title in folder_titles.items():
+        if folder_title == title:
+            return child_folder_id
+    
+    new_folder = retry_api_call(client.new_folder, title=title, parent_id=parent_id)
+    print(f"Created folder: {title}")
+    new_folder_id = new_folder['folder']['id']
+    # Keep the cached listings in step with the folder we just created
+    with folder_cache_lock:
+        folder_list['children'].append({'folder_id': new_folder_id})
+        folder_titles[new_folder_id] = title
+        folder_cache[new_folder_id] = {'folder': new_folder['folder'], 'children': [], 'folder_titles': {}}
+    return new_folder_id
+
+# Cache key holding the Quip folder IDs resolved by the last sync
+FOLDER_IDS_KEY = '__folders__'
+
+def load_folder_ids(cache, root_folder_id):
+    """Get the Quip folder IDs saved by the last sync, keyed by relative path
+    
+    Saved IDs are only reused when syncing to the same root folder.
+    """
+    folder_ids = {(): root_folder_id}
+    saved_folders = cache.get(FOLDER_IDS_KEY, {})
+    if saved_folders.get('root') == root_folder_id:
+        for path, folder_id in saved_folders.get('paths', {}).items():
+            folder_ids[tuple(path.split('/'))] = folder_id
+    return folder_ids
 
-    return current_folder_id
+def save_folder_ids(cache, root_folder_id, folder_ids):
+    """Save the resolved Quip folder IDs in the cache for the next sync"""
+    paths = {'/'.join(folder_parts): folder_id for folder_parts, folder_id in folder_ids.items() if folder_parts}
+    cache[FOLDER_IDS_KEY] = {'root': root_folder_id, 'paths': paths}
+
+def create_folder_structure(client, folder_parts, folder_ids, folder_cache):
+    """Create folder structure in Quip
+    
+    folder_parts is a relative path as a tuple of folder names. folder_ids maps
+    the paths resolved so far to Quip folder IDs and must contain the root ().
+    """
+    if folder_parts not in folder_ids:
+        parent_id = create_folder_structure(client, folder_parts[:-1], folder_ids, folder_cache)
+        folder_ids[folder_parts] = get_or_create_folder(client, folder_parts[-1], parent_id, folder_cache)
+    return folder_ids[folder_parts]
+
+# Number of images of one document uploaded at the same time
+IMAGE_UPLOAD_WORKERS = 4
+
+@lru_cache(maxsize=None)
+def get_image_mime_type(extension):
+    """Get the MIME type of an image file extension, defaulting to JPEG"""
+    mime_type, _ = mimetypes.guess_type('image' + extension)
+    return mime_type or 'image/jpeg'
 
 def upload_image_to_quip(client, image_path, thread_id=None):
     """Upload an image to Quip and return the blob ID"""
@@ -118,30 +468,35 @@ def upload_image_to_quip(client, image_path, thread_id=None):
         # Get image filename
         image_name = os.path.basename(image_path)
         
-        # Determine MIME type
-        mime_type, _ = mimetypes.guess_type(image_path)
-        if not mime_type:
-            # Default to JPEG if can't determine
-            mime_type = 'image/jpeg'
+        # Determine MIME type (looked up once per extension)
+        mime_type = get_image_mime_type(os.path.splitext(image_name)[1].lower())
         
-        # Open image file
+        # Only SessionQuipClient can send the MIME type; the stock client's
+        # put_blob doesn't take one
+        blob_args = {'content_type': mime_type} if isinstance(client, SessionQuipClient) else {}
+        
+        # Read the image up front: a retried upload must send the whole image
+        # again, which an already consumed file object wouldn't
         with open(image_path, 'rb') as f:
-            # Upload blob to the thread
-            print(f"Uploading image: {image_path} to thread: {thread_id}")
-            response = retry_api_call(
-                client.put_blob,
-                thread_id,
-                f,
-                name=image_name
-            )
-            
-            if 'id' in response:
-                print(f"Image uploaded successfully, blob ID: {response['id']}")
-                print(f"Image URL: {response['url']}")
-                return response['id']
-            else:
-                print(f"Error uploading image: {response}")
-                return None
+            image_data = f.read()
+        
+        # Upload blob to the thread
+        print(f"Uploading image: {image_path} to thread: {thread_id}")
+        response = retry_api_call(
+            client.put_blob,
+            thread_id,
+            image_data,
+            name=image_name,
+            **blob_args
+        )
+        
+        if 'id' in response:
+            print(f"Image uploaded successfully, blob ID: {response['id']}")
+            print(f"Image URL: {response['url']}")
+            return response['id']
+        else:
+            print(f"Error uploading image: {response}")
+            return None
     except Exception as e:
         print(f"Error uploading image {image_path}: {e}")
         return None
@@ -154,23 +509,20 @@ def preprocess_markdown_for_images(content, base_dir):
     2. Replaces them with: ####image path: (image_path)
     3. Returns the modified content
     """
-    # Find all markdown image references
-    image_pattern = r'!\[(.*?)\]\((.*?)\)'
-    
     def replace_image(match):
         image_path = match.group(2)
         # Create the special pattern
         return f"####image path: ({image_path})"
     
     # Replace all image references
-    processed_content = re.sub(image_pattern, replace_image, content)
+    processed_content = IMAGE_MARKDOWN_PATTERN.sub(replace_image, content)
     return processed_content
 
-def process_images_after_upload(client, thread_id, base_dir):
+def process_images_after_upload(client, thread_id, base_dir, html=None):
     """Process images in a Quip document after uploading markdown
     
     This function:
-    1. Gets the HTML content of the document
+    1. Gets the HTML content of the document, unless the caller already has it
     2. Finds special image patterns in the HTML
     3. Uploads each image to Quip as a blob
     4. Updates the document with the image blobs
@@ -181,16 +533,16 @@ def process_images_after_upload(client, thread_id, base_dir):
     
     try:
         # Get the document HTML
-        thread_data = retry_api_call(client.get_thread, thread_id)
-        html = thread_data.get('html', '')
+        if html is None:
+            thread_data = retry_api_call(client.get_thread, thread_id)
+            html = thread_data.get('html', '')
         
         if not html:
             print("Warning: Document has no HTML content")
             return True
         
         # Find our special image pattern in the HTML
-        pattern = r'image path:\s*\(([^)]+)\)'
-        image_matches = re.findall(pattern, html)
+        image_matches = IMAGE_PLACEHOLDER_PATTERN.findall(html)
         
         if not image_matches:
             print("No image patterns found in document")
@@ -198,10 +550,9 @@ def process_images_after_upload(client, thread_id, base_dir):
         
         print(f"Found {len(image_matches)} image patterns in document")
         
-        # Process each image
-        processed_images = 0
-        
-        for image_path in image_matches:
+        # Find the local file of each distinct image
+        full_image_paths = {}
+        for image_path in dict.fromkeys(image_matches):
             # Handle relative paths
             if not os.path.isabs(image_path):
                 full_image_path = os.path.join(base_dir, image_path)
@@ -211,11 +562,23 @@ def process_images_after_upload(client, thread_id, base_dir):
             if not os.path.exists(full_image_path):
                 print(f"Warning: Image file not found: {full_image_path}")
                 continue
-                
-            # Upload the image to Quip
-            blob_id = upload_image_to_quip(client, full_image_path, thread_id)
+            full_image_paths[image_path] = full_image_path
+        
+        # Upload the images to Quip in parallel, since uploads are independent
+        with ThreadPoolExecutor(max_workers=IMAGE_UPLOAD_WORKERS) as executor:
+            blob_ids = dict(zip(full_image_paths, executor.map(
+                lambda full_image_path: upload_image_to_quip(client, full_image_path, thread_id),
+                full_image_paths.values())))
+        for image_path, blob_id in blob_ids.items():
+            if not blob_id:
+                print(f"Warning: Failed to upload image: {full_image_paths[image_path]}")
+        
+        # Add each image to the document; edits to the same document must stay in order
+        processed_images = 0
+        
+        for image_path in image_matches:
+            blob_id = blob_ids.get(image_path)
             if not blob_id:
-                print(f"Warning: Failed to upload image: {full_image_path}")
                 continue
 
             content = f"<img src=/blob/{thread_id}/{blob_id}>"
@@ -225,7 +588,7 @@ def process_images_after_upload(client, thread_id, base_dir):
                     thread_id=thread_id,
                     content=content,
                     document_range=f"image path: ({image_path})",
-                    location=7
+                    location=BEFORE_DOCUMENT_RANGE
                 )
             except Exception as e:
                 print(f"Error adding the image {image_path}: {e}")
@@ -237,8 +600,8 @@ def process_images_after_upload(client, thread_id, base_dir):
         print(f"Error processing images after upload: {e}")
         return False
 
-def sync_file(client, file_path, quip_folder_id, cache):
-    """Sync a single file to Quip"""
+def sync_file(client, file_path, quip_folder_id, cached_info, folder_cache, verify=False):
+    """Sync a single file to Quip and return its new cache entry (None to keep the old one)"""
     ##########################################
     ##### Check whether need to update #######
     ##########################################
@@ -246,63 +609,60 @@ def sync_file(client, file_path, quip_folder_id, cache):
     # Check if we need to update the document
     need_update = True
 
-    file_hash = get_file_hash(file_path)
-    if file_hash is None:
-        return cache
-    
-    # Get cached info (might be hash string or dict with hash and doc_id)
-    cached_info = cache.get(file_path, {})
-    if isinstance(cached_info, str):  # Handle old cache format
-        cached_hash = cached_info
-        cached_doc_id = None
-    else:
-        cached_hash = cached_info.get('hash')
-        cached_doc_id = cached_info.get('doc_id')
-    
+    # Taken before the file is stat'd and read, so an edit made while it syncs
+    # falls inside the racy window on the next run
+    checked_ns = time.time_ns()
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Preprocess markdown content to replace image references with special pattern
-        base_dir = os.path.dirname(file_path)
-        content = preprocess_markdown_for_images(content, base_dir)
-    except Exception as e:
+        file_stat = os.stat(file_path)
+    except OSError as e:
         print(f"Error reading file {file_path}: {e}")
-        return cache
+        return None
+    
+    cached_hash = cached_info.get('hash')
+    if cached_info.get('hash_algo') != HASH_ALGO:
+        # Hashed with a different algorithm, so the hashes can't be compared
+        cached_hash = None
+    cached_doc_id = cached_info.get('doc_id')
+    
+    # Only read and hash the file if its modification time or size changed;
+    # the bytes read here are reused for the upload
+    raw_content = None
+    if (cached_hash and cached_info.get('mtime_ns') == file_stat.st_mtime_ns
+            and cached_info.get('size') == file_stat.st_size
+            and cached_info.get('checked_ns', 0) - file_stat.st_mtime_ns > RACY_MTIME_WINDOW_NS):
+        file_hash = cached_hash
+    else:
+        raw_content = read_file_bytes(file_path)
+        if raw_content is None:
+            return None
+        file_hash = get_content_hash(raw_content)
 
     file_name = os.path.basename(file_path)
     name_without_ext = os.path.splitext(file_name)[0]
 
-    # First check if we have a cached document ID and verify it still exists
+    # Get sync status from cache
+    sync_success = cached_info.get('sync_success', False)
+
+    # First check if we have a cached document ID and verify it still exists.
+    # Unchanged files that synced successfully are trusted without the extra
+    # round trip unless verification was requested.
     doc_id = cached_doc_id
-    if doc_id:
+    thread_data = None  # The verified document, reused by the update below
+    if doc_id and (verify or file_hash != cached_hash or not sync_success):
         try:
             # Verify the document still exists
             thread_data = retry_api_call(client.get_thread, doc_id)
             if 'error' in thread_data or not thread_data.get('thread'):
                 print(f"Cached document ID {doc_id} no longer exists, searching for document...")
                 doc_id = None
+                thread_data = None
         except Exception as e:
             print(f"Error accessing cached document ID {doc_id}: {e}")
             doc_id = None
     
     # If no cached ID or it's invalid, search in the folder (TODO: might be redundant due to feature update)
     if not doc_id:
-        folder_content = retry_api_call(client.get_folder, quip_folder_id)
-        for child in folder_content['children']:
-            if 'thread_id' in child:
-                try:
-                    thread_data = retry_api_call(client.get_thread, child['thread_id'])
-                    thread_title = thread_data.get('thread', {}).get('title', '')
-                    if thread_title == name_without_ext:
-                        doc_id = child['thread_id']
-                        break
-                except Exception:
-                    # Skip this thread if we can't access it
-                    continue
-    
-    # Get sync status from cache
-    sync_success = cached_info.get('sync_success', False)
+        doc_id = get_title_index(client, quip_folder_id, folder_cache).get(name_without_ext)
     
     if file_hash == cached_hash and doc_id and sync_success:
         # File hasn't changed locally and last sync was successful, so no need to update
@@ -318,17 +678,36 @@ def sync_file(client, file_path, quip_folder_id, cache):
     ##########################################
     sync_success = False
     if need_update:
+        if raw_content is None:
+            raw_content = read_file_bytes(file_path)
+            if raw_content is None:
+                return None
+        try:
+            # Decode the whole file at once, normalizing newlines like text mode would
+            content = raw_content.decode('utf-8')
+            raw_content = None  # Only the text is needed from here on, so free the bytes
+            if '\r' in content:
+                content = content.replace('\r\n', '\n').replace('\r', '\n')
+            
+            # Preprocess markdown content to replace image references with special pattern
+            base_dir = os.path.dirname(file_path)
+            content = preprocess_markdown_for_images(content, base_dir)
+        except Exception as e:
+            print(f"Error reading file {file_path}: {e}")
+            return None
+
         if doc_id:
             print(f"Updating existing document: {name_without_ext}")
             try:
-                # First check if the document has any content
-                existing_thread = retry_api_call(client.get_thread, doc_id)
+                # First check if the document has any content, fetching it only
+                # if it wasn't already fetched to verify it
+                existing_thread = thread_data or retry_api_call(client.get_thread, doc_id)
                 html = existing_thread.get('html', '')
                 
                 if html and '<h1' in html:
                     # Document has content with headings, use document_range to delete all content
                     # Find the first heading
-                    first_heading_match = re.search(r'<h1[^>]*>(.*?)</h1>', html)
+                    first_heading_match = H1_PATTERN.search(html)
                     
                     if first_heading_match:
                         first_heading = first_heading_match.group(1)
@@ -341,24 +720,25 @@ def sync_file(client, file_path, quip_folder_id, cache):
                                 thread_id=doc_id,
                                 document_range=first_heading,
                                 content="",  # Empty content to delete
-                                location=9  # DELETE_DOCUMENT_RANGE
+                                location=DELETE_DOCUMENT_RANGE
                             )
                         except Exception as e:
                             print(f"Error deleting document range: {e}")
                 
                 # Now add the new content (either the document was emptied or had no headings)
-                retry_api_call(
+                result = retry_api_call(
                     client.edit_document,
                     thread_id=doc_id,
                     content=content,
                     format='markdown',
-                    location=1  # PREPEND (add to beginning of now-empty document)
+                    location=PREPEND  # Add to beginning of now-empty document
                 )
                 
                 # Process images after uploading the markdown content
                 base_dir = os.path.dirname(file_path)
                 sync_success=True
-                if process_images_after_upload(client, doc_id, base_dir):
+                # The edit returns the updated thread, so its HTML doesn't need fetching again
+                if process_images_after_upload(client, doc_id, base_dir, result.get('html')):
                     sync_success = True
                 else:
                     print("Warning: Image processing failed, but document was updated")
@@ -381,9 +761,17 @@ def sync_file(client, file_path, quip_folder_id, cache):
                 doc_id = result.get('thread', {}).get('id')
                 
                 if doc_id:
+                    # Record the new document in the cached folder listing
+                    with folder_cache_lock:
+                        if quip_folder_id in folder_cache:
+                            folder_content = folder_cache[quip_folder_id]
+                            folder_content['children'].append({'thread_id': doc_id})
+                            # An index built later picks the document up from the children
+                            if 'title_index' in folder_content:
+                                folder_content['title_index'][name_without_ext] = doc_id
                     # Process images after uploading the markdown content
                     base_dir = os.path.dirname(file_path)
-                    if process_images_after_upload(client, doc_id, base_dir):
+                    if process_images_after_upload(client, doc_id, base_dir, result.get('html')):
                         sync_success = True
                     else:
                         print("Warning: Image processing failed, but document was created")
@@ -397,117 +785,246 @@ def sync_file(client, file_path, quip_folder_id, cache):
         # If no update needed, consider it a successful sync
         sync_success = True
 
-    # Store file hash, document ID, and sync status in cache
-    cache[file_path] = {
+    # Return file hash, document ID, and sync status for the cache
+    return {
         'hash': file_hash,
+        'hash_algo': HASH_ALGO,
+        'mtime_ns': file_stat.st_mtime_ns,
+        'size': file_stat.st_size,
+        'checked_ns': checked_ns,
         'doc_id': doc_id,
         'last_sync': time.time(),
         'sync_success': sync_success
     }
-    return cache
 
-def detect_deleted_files(local_path, cache):
-    """Detect files that exist in cache but not in local filesystem"""
+def scan_markdown_files(dir_path, folder_parts=(), failed_dirs=None):
+    """Yield (file_path, folder_parts) for every markdown file below dir_path
+    
+    folder_parts is the file's directory relative to the starting directory,
+    as a tuple of folder names. Directories that can't be read are skipped and
+    added to failed_dirs, if given.
+    """
+    try:
+        entries = list(os.scandir(dir_path))
+    except OSError as e:
+        print(f"Error reading directory {dir_path}: {e}")
+        if failed_dirs is not None:
+            failed_dirs.append(dir_path)
+        return
+    for entry in entries:
+        if entry.is_dir():
+            if not entry.is_symlink():  # Like os.walk, don't descend into linked directories
+                yield from scan_markdown_files(entry.path, folder_parts + (entry.name,), failed_dirs)
+        elif entry.name.endswith('.md'):
+            yield entry.path, folder_parts
+
+def detect_deleted_files(local_path, cache, live_files, failed_dirs=()):
+    """Detect files that exist in cache but not in local filesystem
+    
+    live_files are the markdown files just found under local_path, so cached
+    paths below it are checked without touching the disk. Any other cached path
+    (e.g. from a sync with local_path spelled differently, or below one of the
+    failed_dirs the scan couldn't read) is checked on disk.
+    """
+    local_prefix = os.path.join(local_path, '')
+    failed_prefixes = tuple(os.path.join(failed_dir, '') for failed_dir in failed_dirs)
     deleted_files = []
-    for file_path in list(cache.keys()):
-        if not os.path.exists(file_path):
+    for file_path in cache:
+        if file_path == FOLDER_IDS_KEY:  # Not a file
+            continue
+        if file_path.startswith(local_prefix) and not file_path.startswith(failed_prefixes):
+            if file_path not in live_files:
+                deleted_files.append(file_path)
+        elif not os.path.exists(file_path):
             deleted_files.append(file_path)
     return deleted_files
 
-def delete_quip_document(client, file_path, cache):
-    """Delete a Quip document for a deleted markdown file"""
-    cached_info = cache.get(file_path, {})
-    if isinstance(cached_info, str):  # Handle old cache format
-        return cache  # Can't delete if we don't have the doc_id
-    
+def delete_quip_document(client, file_path, cached_info):
+    """Delete a Quip document for a deleted markdown file, returning whether it was deleted"""
     doc_id = cached_info.get('doc_id')
     if not doc_id:
-        return cache
+        return False
     
     try:
         print(f"Deleting document for removed file: {file_path}")
         retry_api_call(client.delete_thread, thread_id=doc_id)
-        del cache[file_path]
+        return True
     except Exception as e:
         print(f"Error deleting document: {e}")
-    
-    return cache
+        return False
 
-def clear_quip_folder(client, folder_id):
-    """Clear all documents and subfolders from a Quip folder"""
+def clear_quip_folder(client, folder_id, max_workers=8):
+    """Clear all documents and subfolders from a Quip folder
+    
+    Folders are walked level by level, fetching the subfolders and document
+    titles of each folder in batch calls, while documents are deleted in parallel.
+    """
+    # Listings fetched while clearing, keyed by folder ID; only used on this thread
+    folder_cache = {}
     try:
-        folder_content = retry_api_call(client.get_folder, folder_id)
-        for child in folder_content.get('children', []):
-            if 'thread_id' in child:
-                thread_id = child['thread_id']
-                # Get thread details to show the title
-                thread_data = retry_api_call(client.get_thread, thread_id)
-                thread_title = thread_data.get('thread', {}).get('title', 'Unknown_Document')
-                print(f"Deleting document: {thread_title}")
-                retry_api_call(client.delete_thread, thread_id=thread_id)
-            elif 'folder_id' in child:
-                subfolder_id = child['folder_id']
-                # Get folder details to show the title
-                subfolder_data = retry_api_call(client.get_folder, subfolder_id)
-                subfolder_title = subfolder_data.get('folder', {}).get('title', 'Unknown_Folder')
-                print(f"Clearing subfolder: {subfolder_title}")
-                clear_quip_folder(client, subfolder_id) # TODO: Currently, Quip doesn't provide API to remove a folder
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            delete_futures = []
+            pending_folder_ids = deque([folder_id])
+            while pending_folder_ids:
+                folder_content = get_folder_cached(client, pending_folder_ids.popleft(), folder_cache)
+                subfolder_ids = [child['folder_id'] for child in folder_content.get('children', []) if 'folder_id' in child]
+                if subfolder_ids:
+                    # Get all subfolders in one batch call and cache them for when they are cleared
+                    subfolders = retry_api_call(client.get_folders, subfolder_ids)
+                    for subfolder_id, subfolder_data in subfolders.items():
+                        folder_cache[subfolder_id] = subfolder_data
+                        subfolder_title = subfolder_data.get('folder', {}).get('title', 'Unknown_Folder')
+                        print(f"Clearing subfolder: {subfolder_title}")
+                        pending_folder_ids.append(subfolder_id) # TODO: Currently, Quip doesn't provide API to remove a folder
+                for thread_id, thread_title in get_child_thread_titles(client, folder_content).items():
+                    print(f"Deleting document: {thread_title or 'Unknown_Document'}")
+                    delete_futures.append(executor.submit(retry_api_call, client.delete_thread, thread_id=thread_id))
+            for future in delete_futures:
+                future.result()
         return True
     except Exception as e:
         print(f"Error clearing folder: {e}")
         return False
 
-def sync_directory(client, local_path, root_folder_id, cache_file, clean_sync=False):
+def sync_directory(client, local_path, root_folder_id, cache_file, clean_sync=False, max_workers=8,
+                   verify=False):
     """Sync entire directory structure to Quip"""
     cache = load_cache(cache_file)
     
     # If clean sync is requested, clear the Quip folder first
     if clean_sync:
         print(f"Performing clean sync - clearing Quip folder {root_folder_id}...")
-        if clear_quip_folder(client, root_folder_id):
+        if clear_quip_folder(client, root_folder_id, max_workers=max_workers):
             # Reset cache since all documents are now gone
             cache = {}
+            save_cache(cache_file, cache)
             print("Quip folder cleared successfully")
         else:
             print("Failed to clear Quip folder completely")
     
-    # Handle deleted files (using cache to detect them)
-    if not clean_sync:
-        deleted_files = detect_deleted_files(local_path, cache)
-        for file_path in deleted_files:
-            cache = delete_quip_document(client, file_path, cache)
-    
-    # First collect all markdown files to sync
-    markdown_files = []
-    for root, dirs, files in os.walk(local_path):
-        for file in files:
-            if file.endswith('.md'):
-                file_path = os.path.join(root, file)
-                markdown_files.append(file_path)
-    
-    # Group files by directory to minimize folder creation
-    files_by_dir = {}
-    for file_path in markdown_files:
-        dir_path = os.path.dirname(file_path)
-        if dir_path not in files_by_dir:
-            files_by_dir[dir_path] = []
-        files_by_dir[dir_path].append(file_path)
-    
-    # Process directories in sorted order for more predictable behavior
-    for dir_path in sorted(files_by_dir.keys()):
-        rel_path = os.path.relpath(dir_path, local_path)
+    # Collect all markdown files to sync in one pass, grouped by directory
+    files_by_dir = defaultdict(list)
+    live_files = set()
+    failed_dirs = []
+    for file_path, folder_parts in scan_markdown_files(local_path, failed_dirs=failed_dirs):
+        files_by_dir[folder_parts].append(file_path)
+        live_files.add(file_path)
+    
+    # Folder listings fetched during this run, keyed by folder ID
+    folder_cache = {}
+    # Quip folder IDs of the directories resolved so far, keyed by relative path,
+    # starting from the ones saved by the last sync unless verifying
+    if verify:
+        folder_ids = {(): root_folder_id}
+    else:
+        folder_ids = load_folder_ids(cache, root_folder_id)
+    # Relative paths whose saved Quip folder turned out to be gone
+    stale_folder_parts = set()
+    
+    # Files are independent of each other, so sync them in parallel while
+    # folders are created one at a time on this thread
+    futures = {}
+    delete_futures = {}
+    updates_since_save = 0
+    last_save = time.monotonic()
+    
+    def record_deletion(future):
+        """Remove a deleted file from the cache"""
+        file_path = delete_futures.pop(future)
+        if future.result():
+            del cache[file_path]
+            append_cache_log(cache_file, file_path, None)
+    
+    def record_sync(future):
+        """Store a synced file's new cache entry"""
+        nonlocal updates_since_save, last_save
+        file_path, folder_parts = futures.pop(future)
+        try:
+            cache_entry = future.result()
+        except Exception as e:
+            print(f"Error syncing {file_path}: {e}")
+            if getattr(e, 'code', None) == 404:
+                # The file's Quip folder is gone; forget it so the next sync looks it up again
+                stale_folder_parts.add(folder_parts)
+            return
+        if cache_entry is not None:
+            old_entry = cache.get(file_path, {})
+            cache[file_path] = cache_entry
+            # An unchanged file's entry only has new timestamps, which the
+            # final save_cache stores; logging it would cost an fsync per file
+            if sync_state_changed(old_entry, cache_entry):
+                append_cache_log(cache_file, file_path, cache_entry)
+                updates_since_save += 1
+                if (updates_since_save >= CACHE_SAVE_INTERVAL_FILES
+                        or time.monotonic() - last_save >= CACHE_SAVE_INTERVAL_SECONDS):
+                    save_cache(cache_file, cache)
+                    updates_since_save = 0
+                    last_save = time.monotonic()
+    
+    def record_finished():
+        """Record the deletions and syncs that have finished so far"""
+        for future in [future for future in delete_futures if future.done() and not future.cancelled()]:
+            record_deletion(future)
+        for future in [future for future in futures if future.done() and not future.cancelled()]:
+            record_sync(future)
+    
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        # Handle deleted files (using cache to detect them) alongside the uploads
+        if not clean_sync:
+            for file_path in detect_deleted_files(local_path, cache, live_files, failed_dirs):
+                future = executor.submit(delete_quip_document, client, file_path, cache[file_path])
+                delete_futures[future] = file_path
         
-        # Get or create the Quip folder
-        if rel_path == '.':
-            current_quip_folder = root_folder_id
-        else:
-            current_quip_folder = create_folder_structure(client, rel_path, root_folder_id)
+        # Process directories in sorted order for more predictable behavior
+        for folder_parts in sorted(files_by_dir.keys()):
+            # Log the files synced while earlier folders were resolved, since
+            # resolving folders can take a while under the rate limit
+            record_finished()
+            
+            # Get or create the Quip folder, and index its documents by title up front
+            # if some files have no cached document ID, rather than from a worker
+            # holding the folder lock
+            index_titles = any(not cache.get(file_path, {}).get('doc_id') for file_path in files_by_dir[folder_parts])
+            try:
+                current_quip_folder = create_folder_structure(client, folder_parts, folder_ids, folder_cache)
+                if index_titles:
+                    get_title_index(client, current_quip_folder, folder_cache)
+            except (urllib.error.HTTPError, QuipError) as e:
+                if e.code != 404 or len(folder_ids) == 1:
+                    raise
+                # A folder saved by the last sync no longer exists, so look them all up again
+                print("Saved Quip folder IDs are out of date, looking up folders again...")
+                folder_ids = {(): root_folder_id}
+                current_quip_folder = create_folder_structure(client, folder_parts, folder_ids, folder_cache)
+                if index_titles:
+                    get_title_index(client, current_quip_folder, folder_cache)
+            
+            # Sync all files in this directory
+            for file_path in files_by_dir[folder_parts]:
+                print(f"Syncing {file_path}...")
+                future = executor.submit(sync_file, client, file_path, current_quip_folder,
+                                         cache.get(file_path, {}), folder_cache, verify)
+                futures[future] = (file_path, folder_parts)
         
-        # Sync all files in this directory
-        for file_path in files_by_dir[dir_path]:
-            print(f"Syncing {file_path}...")
-            cache = sync_file(client, file_path, current_quip_folder, cache)
+        for future in as_completed(list(delete_futures)):
+            record_deletion(future)
+        
+        for future in as_completed(list(futures)):
+            record_sync(future)
+    finally:
+        # If the sync was interrupted, let the running files finish but drop the
+        # queued ones, then log everything that completed
+        executor.shutdown(wait=True, cancel_futures=True)
+        record_finished()
 
+    # Remember the Quip folders of the current directories (and their parents)
+    used_folder_parts = {folder_parts[:depth] for folder_parts in files_by_dir
+                         for depth in range(1, len(folder_parts) + 1)}
+    save_folder_ids(cache, root_folder_id, {
+        folder_parts: folder_id for folder_parts, folder_id in folder_ids.items()
+        if folder_parts in used_folder_parts
+        and not any(folder_parts[:len(stale)] == stale for stale in stale_folder_parts)})
     save_cache(cache_file, cache)
 
 def main():
@@ -515,9 +1032,22 @@ def main():
     parser.add_argument('local_path', help='Path to local folder containing markdown files')
     parser.add_argument('quip_url', help='URL of the Quip folder')
     parser.add_argument('--clean', action='store_true', help='Clear Quip folder before syncing')
+    parser.add_argument('--verify', action='store_true',
+                        help='Check that the Quip documents of unchanged files still exist')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='Number of files to sync in parallel (default: 8)')
+    parser.add_argument('--pool-size', type=int,
+                        help='Number of HTTP connections to keep open (default: 4 x concurrency)')
+    parser.add_argument('--rate-limit', type=int, default=DEFAULT_RATE_LIMIT,
+                        help=f'Maximum API requests per minute (default: {DEFAULT_RATE_LIMIT})')
 
     
     args = parser.parse_args()
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.rate_limit < 1:
+        parser.error("--rate-limit must be at least 1")
+    pool_size = args.pool_size or args.concurrency * 4
     
     folder_id = extract_folder_id_from_url(args.quip_url)
     print("**************************************")
@@ -541,10 +1071,14 @@ def main():
     print(f"Using API URL: {base_url}")
     print("**************************************")
     
-    client = QuipClient(access_token=access_token, base_url=base_url)
+    global token_bucket
+    token_bucket = TokenBucket(rate=args.rate_limit / 60, capacity=args.rate_limit)
+    
+    client = SessionQuipClient(access_token=access_token, base_url=base_url, pool_size=pool_size)
     cache_file = os.path.join(args.local_path, ".quip_sync_cache.json")
     
-    sync_directory(client, args.local_path, folder_id, cache_file, args.clean)
+    sync_directory(client, args.local_path, folder_id, cache_file, args.clean,
+                   max_workers=args.concurrency, verify=args.verify)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file